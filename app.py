@@ -1,23 +1,37 @@
 from __future__ import print_function
 import os
-from datetime import datetime, timedelta
+from pathlib import Path
 
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
+import altair as alt
+import orjson
+import httplib2
 
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 
+from core import HTTP_TIMEOUT, analyze_files, generate_recommendations, sync_drive_files
+
 # Google Drive scope
 SCOPES = ['https://www.googleapis.com/auth/drive.metadata.readonly']
 
+TABLE_COLUMNS = ['name', 'size', 'modifiedTime']
+DUPLICATE_TABLE_COLUMNS = ['group'] + TABLE_COLUMNS
+HTTP_CACHE_DIR = '.http_cache'
+
 def authenticate_gdrive():
+    # Reruns reuse the parsed credentials until token.json is rewritten
     creds = None
+    cached = st.session_state.get('creds')
     if os.path.exists('token.json'):
-        creds = Credentials.from_authorized_user_file('token.json', SCOPES)
+        mtime = os.stat('token.json').st_mtime_ns
+        if cached and cached[0] == mtime:
+            creds = cached[1]
+        else:
+            creds = Credentials.from_authorized_user_info(orjson.loads(Path('token.json').read_bytes()), SCOPES)
 
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
@@ -27,67 +41,54 @@ def authenticate_gdrive():
             creds = flow.run_local_server(port=8080)
         with open('token.json', 'w') as token:
             token.write(creds.to_json())
-    return creds
+    st.session_state['creds'] = (os.stat('token.json').st_mtime_ns, creds)
     return creds
 
-def fetch_drive_files(service):
-    results = service.files().list(
-        pageSize=200,
-        fields="nextPageToken, files(id, name, size, mimeType, modifiedTime)"
-    ).execute()
-    items = results.get('files', [])
-    return items
-
-def fetch_drive_quota(service):
-    about = service.about().get(fields="storageQuota").execute()
-    quota = about.get('storageQuota', {})
-    limit = int(quota.get('limit', 0))
-    used = int(quota.get('usage', 0))
-    return used, limit
-
-def analyze_files(files):
-    df = pd.DataFrame(files)
-    if 'size' in df.columns:
-        df['size'] = pd.to_numeric(df['size'], errors='coerce').fillna(0)
-    df['modifiedTime'] = pd.to_datetime(df['modifiedTime'], errors='coerce')
-
-    # Largest files
-    largest_files = df.sort_values(by='size', ascending=False).head(5)
-
-    # Oldest files
-    oldest_files = df.sort_values(by='modifiedTime', ascending=True).head(5)
-
-    # Duplicates
-    duplicate_names = df[df.duplicated('name', keep=False)].sort_values('name')
-
-    # File type breakdown
-    df['type'] = df['mimeType'].apply(lambda x: x.split('.')[-1] if '.' in x else x.split('/')[-1])
-    type_breakdown = df.groupby('type')['size'].sum().sort_values(ascending=False)
-
-    return largest_files, oldest_files, duplicate_names, type_breakdown
-
-def generate_recommendations(largest, oldest, duplicates):
-    recs = []
-    if not largest.empty:
-        big_files = ", ".join([f"{row['name']} ({row['size']/(1024**2):.2f} MB)" for _, row in largest.iterrows()])
-        recs.append(f"Consider deleting or compressing these large files: {big_files}")
-    if not oldest.empty:
-        old_files = ", ".join([f"{row['name']} (Last modified: {row['modifiedTime'].date()})" for _, row in oldest.iterrows()])
-        recs.append(f"Review these old files for potential removal: {old_files}")
-    if not duplicates.empty:
-        dup_files = ", ".join(duplicates['name'].unique())
-        recs.append(f"Remove duplicates to save space: {dup_files}")
-    return recs
+def get_drive_service(creds):
+    # One pooled, authorized transport per session and token. httplib2 is not
+    # thread-safe and Streamlit runs each session on its own thread, so it
+    # lives in session_state rather than a shared cache. .http_cache lets
+    # httplib2 revalidate cacheable responses instead of refetching them.
+    cached = st.session_state.get('drive_service')
+    if cached and cached[0] == creds.token:
+        return cached[1]
+    http = AuthorizedHttp(creds, http=httplib2.Http(cache=HTTP_CACHE_DIR, timeout=HTTP_TIMEOUT))
+    service = build('drive', 'v3', http=http)
+    st.session_state['drive_service'] = (creds.token, service)
+    return service
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_drive_report(token, _service, _creds):
+    # Only the quota and the small analysis outputs go through the cache,
+    # which unpickles its value on every hit; the raw listing never does.
+    # Tables are trimmed to their display columns once, here, not per rerun.
+    used, limit, files = sync_drive_files(_service, _creds)
+    largest, oldest, duplicates, type_breakdown = analyze_files(files)
+    largest, oldest = (frame[TABLE_COLUMNS] for frame in (largest, oldest))
+    duplicates = duplicates[DUPLICATE_TABLE_COLUMNS]
+    recs = generate_recommendations(largest, oldest, duplicates)
+    return used, limit, largest, oldest, duplicates, type_breakdown, recs
+
+def show_files_table(title, frame):
+    # st.dataframe ships the rows once and virtualizes them in the browser,
+    # and formats byte counts client-side.
+    st.subheader(title)
+    st.dataframe(
+        frame,
+        use_container_width=True,
+        hide_index=True,
+        column_config={'size': st.column_config.NumberColumn("size", format="bytes")},
+    )
 
 def main():
     st.title("Google Drive Context-Aware Optimizer")
 
     st.write("Authenticate to analyze your Google Drive usage.")
     creds = authenticate_gdrive()
-    service = build('drive', 'v3', credentials=creds)
+    service = get_drive_service(creds)
+    used, limit, largest, oldest, duplicates, type_breakdown, recs = load_drive_report(creds.token, service, creds)
 
     # Show storage quota
-    used, limit = fetch_drive_quota(service)
     if limit > 0:
         percent_used = used / limit
         st.subheader("Storage Usage")
@@ -96,32 +97,24 @@ def main():
     else:
         st.warning("Could not fetch storage quota.")
 
-    files = fetch_drive_files(service)
-    largest, oldest, duplicates, type_breakdown = analyze_files(files)
-
     # Display tables
-    st.subheader("Top 5 Largest Files")
-    st.table(largest[['name', 'size', 'modifiedTime']])
-
-    st.subheader("Top 5 Oldest Files")
-    st.table(oldest[['name', 'size', 'modifiedTime']])
-
+    show_files_table("Top 5 Largest Files", largest)
+    show_files_table("Top 5 Oldest Files", oldest)
     if not duplicates.empty:
-        st.subheader("Duplicate Files")
-        st.table(duplicates[['name', 'size', 'modifiedTime']])
+        show_files_table("Duplicate Files", duplicates)
 
     # Display chart
     st.subheader("Storage by File Type")
-    fig, ax = plt.subplots()
     type_breakdown_mb = type_breakdown / (1024**2)
-    type_breakdown_mb.plot(kind='bar', ax=ax)
-    ax.set_ylabel("Size (MB)")
-    ax.set_xlabel("File Type")
-    st.pyplot(fig)
+    # Vega-Lite sorts the x axis alphabetically unless told otherwise
+    chart = alt.Chart(type_breakdown_mb.reset_index()).mark_bar().encode(
+        x=alt.X('type:N', sort='-y', title="File Type"),
+        y=alt.Y('size:Q', title="Size (MB)"),
+    )
+    st.altair_chart(chart, use_container_width=True)
 
     # Recommendations
     st.subheader("Context-Aware Recommendations")
-    recs = generate_recommendations(largest, oldest, duplicates)
     for r in recs:
         st.write(f"- {r}")
 
@@ -0,0 +1,276 @@
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import httplib2
+
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.errors import HttpError
+
+# Drive timestamps are RFC 3339, with or without fractional seconds
+DRIVE_TIME_FORMAT = 'ISO8601'
+
+# File type is the last '.' or '/' segment of the MIME type
+MIME_TYPE_RE = re.compile(r'[./]([^./]+)$')
+
+# 'id' is only kept so changes.list can patch the stored listing; the
+# analysis itself never reads it.
+FILE_COLUMNS = ['id', 'name', 'size', 'mimeType', 'modifiedTime', 'md5Checksum']
+FILE_FIELDS = ", ".join(FILE_COLUMNS)
+CHANGED_FILE_FIELDS = ", ".join(FILE_COLUMNS[1:])
+
+# Local copy of the Drive listing, kept current through changes.list. The
+# token file holds the owning account's permissionId, the change token and
+# when the copy was last rebuilt from a full listing.
+DRIVE_META_PATH = 'drive_meta.parquet'
+DRIVE_CHANGES_TOKEN_PATH = 'drive_meta.token'
+
+# A full relisting every week bounds any drift in the patched copy
+DRIVE_META_MAX_AGE = 7 * 24 * 3600
+
+ABOUT_FIELDS = "storageQuota, user(permissionId)"
+
+# Seconds before a stalled Drive request is abandoned
+HTTP_TIMEOUT = 30
+
+# Listing is split on these modifiedTime boundaries so buckets page in parallel
+MODIFIED_TIME_BOUNDARIES = ['2018-01-01', '2021-01-01', '2023-01-01', '2025-01-01']
+
+def modified_time_queries(boundaries=MODIFIED_TIME_BOUNDARIES):
+    queries = []
+    lower = None
+    for upper in list(boundaries) + [None]:
+        clauses = []
+        if lower:
+            clauses.append(f"modifiedTime >= '{lower}T00:00:00'")
+        if upper:
+            clauses.append(f"modifiedTime < '{upper}T00:00:00'")
+        queries.append(" and ".join(clauses))
+        lower = upper
+    return queries
+
+def list_files_request(service, page_token=None, query=None):
+    return service.files().list(
+        q=query or None,
+        pageSize=1000,
+        pageToken=page_token,
+        fields=f"nextPageToken, files({FILE_FIELDS})"
+    )
+
+def fetch_drive_files(service, first_page=None, query=None, http=None):
+    items = []
+    results = first_page
+    page_token = None
+    while True:
+        if results is None:
+            results = list_files_request(service, page_token, query).execute(http=http)
+        items.extend(results.get('files', []))
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
+        results = None
+    return items
+
+def fetch_drive_files_parallel(service, creds, first_pages, queries=None):
+    # Each modifiedTime bucket pages independently, so the buckets can be
+    # walked concurrently. httplib2 is not thread-safe, hence one Http each.
+    queries = queries or modified_time_queries()
+
+    def fetch_bucket(query, first_page):
+        http = AuthorizedHttp(creds, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+        return fetch_drive_files(service, first_page=first_page, query=query, http=http)
+
+    # A file edited mid-listing can move into a later bucket and be seen
+    # twice, so merge on id; later buckets hold the newer copy.
+    files_by_id = {}
+    with ThreadPoolExecutor(max_workers=len(queries)) as pool:
+        for bucket in pool.map(fetch_bucket, queries, first_pages):
+            files_by_id.update((f['id'], f) for f in bucket)
+    return list(files_by_id.values())
+
+def parse_drive_about(about):
+    quota = about.get('storageQuota', {})
+    limit = int(quota.get('limit', 0))
+    used = int(quota.get('usage', 0))
+    account_id = about.get('user', {}).get('permissionId')
+    return used, limit, account_id
+
+def fetch_drive_about(service):
+    about = service.about().get(fields=ABOUT_FIELDS).execute()
+    return parse_drive_about(about)
+
+def fetch_drive_overview(service, queries=None):
+    # Quota and the first page of every bucket go out in one batch request.
+    # The changes start token is taken on its own beforehand: Drive does not
+    # order calls within a batch, and a token issued after a page was read
+    # would silently skip changes made in between.
+    queries = queries or modified_time_queries()
+    start_token = service.changes().getStartPageToken().execute()['startPageToken']
+    responses = {}
+
+    def callback(request_id, response, exception):
+        if exception is not None:
+            raise exception
+        responses[request_id] = response
+
+    batch = service.new_batch_http_request(callback=callback)
+    batch.add(service.about().get(fields=ABOUT_FIELDS), request_id='about')
+    for i, query in enumerate(queries):
+        batch.add(list_files_request(service, query=query), request_id=f'files-{i}')
+    batch.execute()
+
+    used, limit, account_id = parse_drive_about(responses['about'])
+    first_pages = [responses[f'files-{i}'] for i in range(len(queries))]
+    return used, limit, account_id, first_pages, start_token
+
+def apply_drive_changes(service, files, page_token):
+    files_by_id = {f['id']: f for f in files}
+    while True:
+        results = service.changes().list(
+            pageToken=page_token,
+            pageSize=1000,
+            fields=f"nextPageToken, newStartPageToken, changes(changeType, fileId, removed, file({CHANGED_FILE_FIELDS}))"
+        ).execute()
+        for change in results.get('changes', []):
+            if change.get('changeType', 'file') != 'file':
+                continue
+            if change.get('removed') or 'file' not in change:
+                files_by_id.pop(change['fileId'], None)
+            else:
+                files_by_id[change['fileId']] = {'id': change['fileId'], **change['file']}
+        if 'newStartPageToken' in results:
+            return list(files_by_id.values()), results['newStartPageToken']
+        page_token = results['nextPageToken']
+
+def load_drive_meta():
+    missing = None, None, None, None
+    if not (os.path.exists(DRIVE_META_PATH) and os.path.exists(DRIVE_CHANGES_TOKEN_PATH)):
+        return missing
+    with open(DRIVE_CHANGES_TOKEN_PATH) as f:
+        header = f.read().split()
+    if len(header) != 3:
+        # Written by an older version without all fields; rebuild it
+        return missing
+    account_id, page_token, listed_at = header
+    listed_at = float(listed_at)
+    if time.time() - listed_at > DRIVE_META_MAX_AGE:
+        return missing
+    frame = pd.read_parquet(DRIVE_META_PATH)
+    if not set(FILE_COLUMNS).issubset(frame.columns):
+        # Written before a field was added to the listing; rebuild it
+        return missing
+    files = frame.astype(object).where(frame.notna(), None).to_dict('records')
+    return files, account_id, page_token, listed_at
+
+def save_drive_meta(files, account_id, page_token, listed_at):
+    frame = pd.DataFrame(files, columns=FILE_COLUMNS)
+    frame.to_parquet(DRIVE_META_PATH, compression='zstd', index=False)
+    with open(DRIVE_CHANGES_TOKEN_PATH, 'w') as f:
+        f.write(f"{account_id}\n{page_token}\n{listed_at}\n")
+
+def sync_drive_files(service, creds):
+    # Returns quota and the full listing, patching the stored copy through
+    # changes.list when it belongs to the signed-in account.
+    files, stored_account_id, page_token, listed_at = load_drive_meta()
+    if files is not None:
+        try:
+            used, limit, account_id = fetch_drive_about(service)
+            if account_id != stored_account_id:
+                files = None
+            else:
+                files, page_token = apply_drive_changes(service, files, page_token)
+        except HttpError:
+            # Expired or invalid change token: fall back to a full listing
+            files = None
+    if files is None:
+        listed_at = time.time()
+        used, limit, account_id, first_pages, page_token = fetch_drive_overview(service)
+        files = fetch_drive_files_parallel(service, creds, first_pages)
+    save_drive_meta(files, account_id, page_token, listed_at)
+    return used, limit, files
+
+def smallest_positions(values, n):
+    # Unordered positions of the n smallest values; O(N) instead of a full sort
+    if len(values) <= n:
+        return np.arange(len(values))
+    return np.argpartition(values, n - 1)[:n]
+
+def duplicate_positions(*columns):
+    # One hashing pass: codes are assigned in sorted key order, so a stable
+    # argsort over the codes groups equal keys together.
+    if len(columns[0]) == 0:
+        return np.arange(0)
+    values = columns[0] if len(columns) == 1 else pd.MultiIndex.from_arrays(columns)
+    codes, _ = pd.factorize(values, sort=True, use_na_sentinel=False)
+    positions = np.flatnonzero(np.bincount(codes)[codes] > 1)
+    return positions[np.argsort(codes[positions], kind='stable')]
+
+def build_files_frame(files):
+    # Column-wise construction with fixed dtypes; Google Docs and folders
+    # report no size and count as zero bytes.
+    return pd.DataFrame({
+        'name': [f.get('name') for f in files],
+        'mimeType': [f.get('mimeType', '') for f in files],
+        'modifiedTime': pd.to_datetime(
+            [f.get('modifiedTime') for f in files],
+            errors='coerce', utc=True, format=DRIVE_TIME_FORMAT
+        ),
+        'md5Checksum': [f.get('md5Checksum') for f in files],
+        'size': np.fromiter((int(f.get('size') or 0) for f in files), dtype=np.int64, count=len(files)),
+    })
+
+def analyze_files(files):
+    df = build_files_frame(files)
+
+    # Largest files
+    sizes = df['size'].to_numpy()
+    largest_files = df.iloc[smallest_positions(-sizes, 5)].sort_values(by='size', ascending=False)
+
+    # Oldest files (NaT pushed to the end, as sort_values would)
+    mtimes = df['modifiedTime'].to_numpy(dtype='datetime64[ns]').view('i8')
+    mtimes = np.where(df['modifiedTime'].isna().to_numpy(), np.iinfo(np.int64).max, mtimes)
+    oldest_files = df.iloc[smallest_positions(mtimes, 5)].sort_values(by='modifiedTime', ascending=True)
+
+    # Duplicates: same content checksum and size. Google Docs and folders
+    # carry no md5Checksum and are never reported.
+    hashed = np.flatnonzero(df['md5Checksum'].notna().to_numpy())
+    md5s = df['md5Checksum'].to_numpy()[hashed]
+    duplicate_files = df.iloc[hashed[duplicate_positions(md5s, sizes[hashed])]]
+    # Number each set of copies so the table shows which rows belong
+    # together, then list every set by name.
+    dup_md5s = duplicate_files['md5Checksum'].to_numpy()
+    dup_sizes = duplicate_files['size'].to_numpy()
+    starts = np.ones(len(duplicate_files), dtype=bool)
+    starts[1:] = (dup_md5s[1:] != dup_md5s[:-1]) | (dup_sizes[1:] != dup_sizes[:-1])
+    duplicate_files = duplicate_files.assign(group=np.cumsum(starts)).sort_values(['group', 'name'], kind='stable')
+
+    # File type breakdown, grouped on the bare size array rather than df
+    mime_types = df['mimeType'].astype('string')
+    types = mime_types.str.extract(MIME_TYPE_RE, expand=False).fillna(mime_types).astype('category')
+    type_breakdown = (
+        pd.Series(sizes, name='size')
+        .groupby(types.array, sort=False, observed=True)
+        .sum()
+        .rename_axis('type')
+        .sort_values(ascending=False)
+    )
+
+    return largest_files, oldest_files, duplicate_files, type_breakdown
+
+def generate_recommendations(largest, oldest, duplicates):
+    recs = []
+    if not largest.empty:
+        sizes_mb = pd.Series(np.char.mod('%.2f', largest['size'].to_numpy() / (1 << 20)), index=largest.index)
+        big_files = largest['name'].str.cat(" (" + sizes_mb + " MB)").str.cat(sep=", ")
+        recs.append(f"Consider deleting or compressing these large files: {big_files}")
+    if not oldest.empty:
+        dates = oldest['modifiedTime'].dt.strftime('%Y-%m-%d').fillna("NaT")
+        old_files = oldest['name'].str.cat(" (Last modified: " + dates + ")").str.cat(sep=", ")
+        recs.append(f"Review these old files for potential removal: {old_files}")
+    if not duplicates.empty:
+        dup_files = ", ".join(duplicates['name'].unique())
+        recs.append(f"Remove duplicates to save space: {dup_files}")
+    return recs